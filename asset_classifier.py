@@ -0,0 +1,149 @@
+# asset_classifier.py
+import fnmatch
+import hashlib
+import os
+import re
+
+FIRST_PARTY = "first_party"
+VENDOR = "vendor"
+
+# Глобы по имени файла: что заведомо стороннее и что заведомо своё
+DEFAULT_VENDOR_GLOBS = [
+    "*chunk-vendors*",
+    "*vendor*.js",
+    "*vendor*.css",
+    "gtm.js",
+    "analytics.js",
+    "tag.js",
+    "hls*.js",
+    "jquery*.js",
+    "hammer*.js",
+]
+DEFAULT_FIRST_PARTY_GLOBS = [
+    "tilda-blocks-page*",
+]
+
+# Отпечатки известных библиотек (ищем в начале файла)
+KNOWN_LIBRARY_FINGERPRINTS = [
+    re.compile(r"jQuery v\d"),
+    re.compile(r"Copyright \d{4} Google Inc\. All rights reserved"),
+    re.compile(r"Copyright The Closure Library Authors"),
+    re.compile(r"Hammer\.JS - v\d"),
+    re.compile(r"\bHls\.DefaultConfig\b|hls\.js"),
+]
+LICENSE_BANNER_PATTERN = re.compile(r"/\*!|@license|Licensed under|Copyright")
+
+HEAD_SIZE = 4096
+MINIFIED_AVG_LINE_LENGTH = 500
+
+_content_cache = {}
+# (путь, mtime, размер) -> sha1: при повторных вызовах файл не перечитывается
+_digest_cache = {}
+
+
+def _env_globs(name: str) -> list:
+    return [g.strip() for g in os.getenv(name, "").split(",") if g.strip()]
+
+
+def configured_vendor_globs() -> list:
+    """Глобы по умолчанию плюс ASSET_VENDOR_GLOBS (через запятую)."""
+    return DEFAULT_VENDOR_GLOBS + _env_globs("ASSET_VENDOR_GLOBS")
+
+
+def configured_first_party_globs() -> list:
+    """Глобы по умолчанию плюс ASSET_FIRST_PARTY_GLOBS (через запятую)."""
+    return DEFAULT_FIRST_PARTY_GLOBS + _env_globs("ASSET_FIRST_PARTY_GLOBS")
+
+
+def _basename(path: str) -> str:
+    # Отрезаем ?t=... из href/src, если путь пришёл прямо из HTML
+    return os.path.basename(path.split("?", 1)[0])
+
+
+def _match_any(name: str, globs: list) -> bool:
+    return any(fnmatch.fnmatch(name, g) for g in globs)
+
+
+def is_minified(text: str) -> bool:
+    """
+    Грубая эвристика минификации: очень длинные строки в среднем.
+    """
+    if not text:
+        return False
+    lines = text.count("\n") + 1
+    return len(text) / lines >= MINIFIED_AVG_LINE_LENGTH
+
+
+def _classify_content(text: str) -> str:
+    head = text[:HEAD_SIZE]
+    if any(p.search(head) for p in KNOWN_LIBRARY_FINGERPRINTS):
+        return VENDOR
+    if is_minified(text) and LICENSE_BANNER_PATTERN.search(head):
+        return VENDOR
+    return FIRST_PARTY
+
+
+def classify_asset(
+    path: str,
+    vendor_globs: list = None,
+    first_party_globs: list = None
+) -> str:
+    """
+    Определяет, является ли CSS/JS файл своим (first_party) или сторонним (vendor).
+
+    Порядок проверок:
+      1) first_party_globs — явное указание, что файл свой;
+      2) vendor_globs — явное указание, что файл сторонний;
+      3) отпечатки известных библиотек и эвристика минификации по содержимому.
+
+    Если глобы не переданы, берутся configured_*_globs() (умолчания + переменные окружения).
+    Результат проверки по содержимому кэшируется по sha1 файла, а sha1 — по
+    (путь, mtime, размер), так что неизменённый файл повторно не читается.
+    Несуществующие файлы считаются своими, чтобы не терять их молча.
+    """
+    if vendor_globs is None:
+        vendor_globs = configured_vendor_globs()
+    if first_party_globs is None:
+        first_party_globs = configured_first_party_globs()
+
+    name = _basename(path)
+    if _match_any(name, first_party_globs):
+        return FIRST_PARTY
+    if _match_any(name, vendor_globs):
+        return VENDOR
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return FIRST_PARTY
+
+    stat_key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _digest_cache.get(stat_key)
+    if digest is not None and digest in _content_cache:
+        return _content_cache[digest]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    _digest_cache[stat_key] = digest
+    tier = _content_cache.get(digest)
+    if tier is None:
+        tier = _classify_content(raw.decode("utf-8", errors="ignore"))
+        _content_cache[digest] = tier
+    return tier
+
+
+def split_assets(
+    paths: list,
+    vendor_globs: list = None,
+    first_party_globs: list = None
+) -> tuple:
+    """
+    Делит список путей на (first_party, vendor), сохраняя исходный порядок.
+    """
+    first_party = []
+    vendor = []
+    for path in paths:
+        tier = classify_asset(path, vendor_globs, first_party_globs)
+        (vendor if tier == VENDOR else first_party).append(path)
+    return first_party, vendor
@@ -0,0 +1,52 @@
+# bench_css_index_memory.py
+"""
+Сравнение памяти CSS-индекса: старый формат (список словарей с копиями подстрок)
+против CssIndex (текст файла один раз + смещения в array).
+
+Запуск:
+    python bench_css_index_memory.py [папка_с_css]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+from indexer_utils import create_css_index, index_css_file
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+def _build_dict_index(css_files: list) -> list:
+    # Прежний формат create_css_index: по словарю на правило
+    return [rule.to_dict() for rule in create_css_index(css_files)]
+
+
+def main(css_dir: str = "templ/css"):
+    css_files = sorted(
+        os.path.join(css_dir, name) for name in os.listdir(css_dir) if name.endswith(".css")
+    )
+    # Прогрев: регэкспы и импорт не должны попадать в замер
+    for cssfile in css_files[:1]:
+        index_css_file(cssfile)
+
+    dict_index, dict_mem, dict_peak = _measure(lambda: _build_dict_index(css_files))
+    del dict_index
+    compact_index, compact_mem, compact_peak = _measure(lambda: create_css_index(css_files))
+
+    print(f"Файлов: {len(css_files)}, правил: {len(compact_index)}")
+    print(f"{'формат':<12}{'держит, КБ':>14}{'пик, КБ':>14}")
+    print(f"{'dict':<12}{dict_mem / 1024:>14.0f}{dict_peak / 1024:>14.0f}")
+    print(f"{'CssIndex':<12}{compact_mem / 1024:>14.0f}{compact_peak / 1024:>14.0f}")
+    print(f"Экономия: {1 - compact_mem / dict_mem:.0%}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,114 @@
+# boot.py
+"""
+Прогрев сервера после старта: тяжёлые импорты, индексация сайтов и соединение с LLM
+выполняются в фоне, а готовность отдаётся через /healthz для балансировщика.
+"""
+import asyncio
+import os
+import time
+
+import json_codec
+
+# PREWARM=0 — не прогревать: инстанс сразу считается готовым, всё грузится лениво
+PREWARM = os.getenv("PREWARM", "1") != "0"
+HEALTH_PATH = "/healthz"
+WARMUP_ATTEMPTS = int(os.getenv("WARMUP_ATTEMPTS", "3"))
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "5"))
+
+readiness = {
+    "ready": not PREWARM,
+    "stage": "boot" if PREWARM else "lazy",
+    "sites": [],
+    "error": None,
+    "warmup_seconds": None
+}
+
+
+def registered_sites() -> list:
+    """
+    Сайты для прогрева: WARM_SITES (пути к index.html через os.pathsep)
+    или сайт по умолчанию из main.ROOT_PATH.
+    """
+    env_sites = os.getenv("WARM_SITES", "")
+    if env_sites:
+        return [p for p in env_sites.split(os.pathsep) if p]
+    from main import ROOT_PATH
+    return [ROOT_PATH]
+
+
+def _warm_up_sync():
+    started = time.monotonic()
+
+    readiness["stage"] = "imports"
+    import main  # noqa: F401 — тянет bs4, openai-клиент и весь пайплайн
+    from site_index import get_css_index_text, index_sites
+
+    readiness["stage"] = "indexing"
+    sites = [p for p in registered_sites() if os.path.exists(p)]
+    for site in index_sites(sites).values():
+        get_css_index_text(site)
+    readiness["sites"] = sites
+
+    readiness["stage"] = "llm"
+    from llm_client import warm_up_connection
+    try:
+        warm_up_connection()
+    except Exception as e:
+        # Недоступный провайдер не должен держать инстанс вне ротации —
+        # запросы всё равно идут с таймаутом и хеджированием
+        print(f"⚠️ Не удалось прогреть соединение с LLM: {e}")
+
+    readiness["warmup_seconds"] = round(time.monotonic() - started, 2)
+
+
+async def warm_up():
+    """
+    Фоновый прогрев; по завершении инстанс помечается готовым.
+    Неудачный прогрев повторяется WARMUP_ATTEMPTS раз, после чего инстанс
+    всё равно входит в ротацию в ленивом режиме — индексы соберутся на первом запросе.
+    """
+    if not PREWARM:
+        return
+    for attempt in range(1, WARMUP_ATTEMPTS + 1):
+        try:
+            await asyncio.to_thread(_warm_up_sync)
+        except Exception as e:
+            readiness["error"] = str(e)
+            print(f"❌ Прогрев не удался (попытка {attempt}/{WARMUP_ATTEMPTS}): {e}")
+            if attempt < WARMUP_ATTEMPTS:
+                await asyncio.sleep(WARMUP_RETRY_DELAY)
+            continue
+        readiness["stage"] = "ready"
+        readiness["ready"] = True
+        readiness["error"] = None
+        print(f"✅ Сервер прогрет за {readiness['warmup_seconds']} с")
+        return
+
+    readiness["stage"] = "lazy"
+    readiness["ready"] = True
+    print("⚠️ Прогрев пропущен, инстанс работает в ленивом режиме")
+
+
+async def health_app(scope, receive, send):
+    """
+    Минимальное ASGI-приложение для /healthz: 200, когда инстанс прогрет, иначе 503.
+    """
+    if scope["type"] == "websocket":
+        # Вебсокеты вне socket.io не обслуживаем: закрываем рукопожатие
+        await receive()
+        await send({"type": "websocket.close", "code": 1000})
+        return
+    if scope["type"] != "http":
+        return
+    if scope["path"] != HEALTH_PATH:
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    body = json_codec.dumps(readiness).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 200 if readiness["ready"] else 503,
+        "headers": [(b"content-type", b"application/json")]
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,37 +1,50 @@
 # context_builder.py
 import os
 
-def build_detailed_prompt(
-    user_command: str,
+RESPONSE_FORMAT = (
+    "Верни результат в следующем формате:\n"
+    "   ### New HTML Block\n"
+    "   <...>\n\n"
+    "   ### Additional CSS\n"
+    "   <...>\n\n"
+    "   ### Additional JS\n"
+    "   <...>\n\n"
+    "   ### Explanation\n"
+    "   <...>\n"
+)
+
+INTRO = (
+    "Имеется HTML-блок, его родительское окружение, CSS и JS, а также индекс CSS-правил, "
+    "из которого видно, в каких файлах и на каких строках находятся ключевые правила. "
+    "Необходимо внести изменения в выбранный элемент согласно команде пользователя."
+)
+
+INSTRUCTIONS = (
+    "На основе приведённых данных:\n"
+    "1) Обнови/измени HTML-блок так, чтобы удовлетворить команду пользователя.\n"
+    "2) Если требуется, измени соответствующее правило CSS (ссылаясь на его ID из CSS-индекса) или добавь новое правило.\n"
+    "3) Если требуется, обнови/добавь JS, чтобы обеспечить функциональность.\n\n"
+    + RESPONSE_FORMAT
+)
+
+# Раскладка prompt: "default" — как раньше, "cached" — статичный префикс сайта + запрос в конце
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "default")
+
+_static_prefixes = {}
+
+
+def build_element_sections(
     snippet: str,
     parents: str,
     related_css: str,
-    related_js: str,
-    css_index_str: str = ""
+    related_js: str
 ) -> str:
     """
-    Формирует развернутый текстовый prompt для LLM, который включает:
-      1. Введение: описание задачи и контекста.
-      2. Исходный HTML-блок (snippet) выбранного элемента.
-      3. Родительские контейнеры (HTML-окружение элемента).
-      4. Связанный CSS – все стили, в которых упоминаются id/классы элемента.
-      5. Связанный JS – все скрипты, где содержится код, связанный с элементом.
-      6. (Опционально) CSS-Index – индекс CSS-правил с информацией об их расположении (файл, селектор, номер строки).
-      7. Команда пользователя, описывающая требуемые изменения.
-      8. Инструкции, каким должен быть формат ответа LLM.
-
-    Возвращает единый текст prompt.
+    Секции, относящиеся к конкретному выбранному элементу:
+    snippet, родители, связанный CSS и JS.
     """
     sections = []
 
-    # 1. Введение
-    sections.append("## Введение")
-    sections.append(
-        "Имеется HTML-блок, его родительское окружение, CSS и JS, а также индекс CSS-правил, "
-        "из которого видно, в каких файлах и на каких строках находятся ключевые правила. "
-        "Необходимо внести изменения в выбранный элемент согласно команде пользователя."
-    )
-
     # 2. Исходный HTML-блок (snippet)
     sections.append("\n## Исходный HTML-блок (snippet)")
     sections.append(snippet.strip() if snippet.strip() else "— (пусто)")
@@ -48,39 +61,175 @@ def build_detailed_prompt(
     sections.append("\n## Связанный JS")
     sections.append(related_js.strip() if related_js.strip() else "— (нет JS)")
 
+    return "\n".join(sections)
+
+
+def build_prompt_prefix(
+    snippet: str,
+    parents: str,
+    related_css: str,
+    related_js: str
+) -> str:
+    """
+    Формирует часть prompt, не зависящую от команды пользователя
+    (введение, snippet, родители, связанный CSS/JS). Её можно посчитать заранее,
+    пока пользователь ещё набирает команду.
+    """
+    # 1. Введение
+    return "\n".join([
+        "## Введение",
+        INTRO,
+        build_element_sections(snippet, parents, related_css, related_js)
+    ])
+
+
+def build_static_prefix(css_index_str: str, index_version: str) -> str:
+    """
+    Статичная часть prompt для раскладки "cached": введение, инструкции и сводка CSS-индекса сайта
+    (селекторы по файлам с лимитом размера, см. site_index.get_css_index_text).
+    Зависит только от индекса, поэтому побайтово совпадает между запросами
+    и попадает в prompt-кэш провайдера. Собранные префиксы кэшируются по index_version.
+    """
+    prefix = _static_prefixes.get(index_version)
+    if prefix is None:
+        prefix = "\n".join([
+            "## Введение",
+            INTRO,
+            "\n## Инструкции",
+            INSTRUCTIONS,
+            f"\n## CSS-Index (версия {index_version})",
+            "Ниже приведена сводка CSS-правил сайта: по каждому файлу — ID и селекторы правил "
+            "(тела правил выбранного элемента даны в разделе «Связанный CSS»). "
+            "Если необходимо внести изменения в CSS, можно ссылаться на конкретное правило по его ID.",
+            css_index_str.strip() if css_index_str.strip() else "— (пусто)",
+            "\n## Запрос"
+        ])
+        _static_prefixes[index_version] = prefix
+    return prefix
+
+
+def build_cached_prompt(
+    user_command: str,
+    element_sections: str,
+    css_index_str: str,
+    index_version: str
+) -> dict:
+    """
+    Собирает prompt в раскладке "cached": сначала статичный префикс сайта,
+    затем секции элемента и команда пользователя.
+
+    Возвращает:
+    {
+        "text": полный prompt,
+        "prefix_version": версия индекса, к которой привязан префикс,
+        "prefix_chars": длина статичного префикса в символах
+    }
+    """
+    static_prefix = build_static_prefix(css_index_str, index_version)
+    final_text = "\n".join([
+        static_prefix,
+        element_sections,
+        "\n## Команда пользователя",
+        user_command
+    ])
+    save_prompt_to_file(final_text)
+    return {
+        "text": final_text,
+        "prefix_version": index_version,
+        "prefix_chars": len(static_prefix)
+    }
+
+
+def build_detailed_prompt(
+    user_command: str,
+    snippet: str = "",
+    parents: str = "",
+    related_css: str = "",
+    related_js: str = "",
+    css_index_str: str = "",
+    prompt_prefix: str = None
+) -> str:
+    """
+    Формирует развернутый текстовый prompt для LLM, который включает:
+      1. Введение: описание задачи и контекста.
+      2. Исходный HTML-блок (snippet) выбранного элемента.
+      3. Родительские контейнеры (HTML-окружение элемента).
+      4. Связанный CSS – все стили, в которых упоминаются id/классы элемента.
+      5. Связанный JS – все скрипты, где содержится код, связанный с элементом.
+      6. (Опционально) CSS-Index – индекс CSS-правил с информацией об их расположении (файл, селектор, номер строки).
+      7. Команда пользователя, описывающая требуемые изменения.
+      8. Инструкции, каким должен быть формат ответа LLM.
+
+    Пункты 1–5 можно передать готовыми через prompt_prefix (см. build_prompt_prefix).
+
+    Возвращает единый текст prompt.
+    """
+    if prompt_prefix is None:
+        prompt_prefix = build_prompt_prefix(snippet, parents, related_css, related_js)
+    sections = [prompt_prefix]
+
     # 7. Команда пользователя
     sections.append("\n## Команда пользователя")
     sections.append(user_command)
 
     # 8. Инструкции для LLM
     sections.append("\n## Инструкции")
+    sections.append(INSTRUCTIONS)
+
+    final_text = "\n".join(sections)
+    save_prompt_to_file(final_text)
+    return final_text
+
+
+def build_followup_prompt(
+    user_command: str,
+    previous_command: str,
+    current_html: str,
+    previous_css: str = ""
+) -> str:
+    """
+    Компактный prompt для повторной правки того же элемента в рамках сессии:
+    вместо полного контекста (родители, связанный CSS/JS) передаются только
+    результат прошлой правки и новая команда.
+    """
+    sections = []
+
+    sections.append("## Продолжение правки")
     sections.append(
-        "На основе приведённых данных:\n"
-        "1) Обнови/измени HTML-блок так, чтобы удовлетворить команду пользователя.\n"
-        "2) Если требуется, измени соответствующее правило CSS (ссылаясь на его ID из CSS-индекса) или добавь новое правило.\n"
-        "3) Если требуется, обнови/добавь JS, чтобы обеспечить функциональность.\n\n"
-        "Верни результат в следующем формате:\n"
-        "   ### New HTML Block\n"
-        "   <...>\n\n"
-        "   ### Additional CSS\n"
-        "   <...>\n\n"
-        "   ### Additional JS\n"
-        "   <...>\n\n"
-        "   ### Explanation\n"
-        "   <...>\n"
+        "Элемент уже был изменён по предыдущей команде. "
+        "Внеси в текущую версию изменения согласно новой команде."
     )
 
+    sections.append("\n## Предыдущая команда")
+    sections.append(previous_command.strip() if previous_command.strip() else "—")
+
+    sections.append("\n## Текущий HTML-блок")
+    sections.append(current_html.strip())
+
+    sections.append("\n## CSS, добавленный предыдущей правкой")
+    sections.append(previous_css.strip() if previous_css.strip() else "— (нет CSS)")
+
+    sections.append("\n## Новая команда пользователя")
+    sections.append(user_command)
+
+    sections.append("\n## Инструкции")
+    sections.append(RESPONSE_FORMAT)
+
     final_text = "\n".join(sections)
+    save_prompt_to_file(final_text)
+    return final_text
+
 
-    # Дополнительное сохранение prompt в файл для отладки
-    prompt_file = "prompt.txt"
+def save_prompt_to_file(prompt_text: str, prompt_file: str = "prompt.txt"):
+    """
+    Дополнительное сохранение prompt в файл для отладки.
+    """
     if os.path.dirname(prompt_file):
         os.makedirs(os.path.dirname(prompt_file), exist_ok=True)
     with open(prompt_file, "w", encoding="utf-8") as f:
-        f.write(final_text)
+        f.write(prompt_text)
 
-    print("Сохранён промпт в 'prompt.txt'")
-    return final_text
+    print(f"Сохранён промпт в '{prompt_file}'")
 
 
 def save_full_context_to_file(context: dict, path: str = "context_summary.txt"):
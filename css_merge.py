@@ -0,0 +1,358 @@
+# css_merge.py
+import re
+
+_ws_pattern = re.compile(r"\s+")
+_comma_pattern = re.compile(r"\s*,\s*")
+
+
+def normalize_selector(selector: str) -> str:
+    """
+    Приводит селектор к ключу для сравнения: схлопывает пробелы и пробелы вокруг запятых.
+    """
+    return _comma_pattern.sub(",", _ws_pattern.sub(" ", selector).strip())
+
+
+def normalize_at_rule(prelude: str) -> str:
+    """
+    Ключ для прелюдии at-правила: "@media (max-width: 640px)" == "@media (max-width:640px)".
+    """
+    return re.sub(r"\s*([:,()])\s*", r"\1", _ws_pattern.sub(" ", prelude).strip()).lower()
+
+
+def _skip_comment_or_string(text: str, i: int) -> int:
+    """
+    Если в позиции i начинается комментарий или строка — возвращает позицию за ними,
+    иначе возвращает i.
+    """
+    if text.startswith("/*", i):
+        end = text.find("*/", i + 2)
+        return len(text) if end == -1 else end + 2
+    if text[i] in "\"'":
+        quote = text[i]
+        j = i + 1
+        while j < len(text) and text[j] != quote:
+            j += 2 if text[j] == "\\" else 1
+        return j + 1
+    return i
+
+
+# At-правила, внутри которых лежат обычные правила — только они становятся контекстом.
+# Остальные (@font-face, @page, @keyframes, @property, @import, ...) — непрозрачные блоки.
+GROUPING_AT_RULES = {"@media", "@supports", "@layer", "@container", "@document", "@-moz-document"}
+
+
+def _at_rule_name(prelude: str) -> str:
+    match = re.match(r"@[\w-]+", prelude)
+    return match.group(0).lower() if match else ""
+
+
+def _find_block_end(css_text: str, open_pos: int) -> int:
+    """Позиция закрывающей скобки блока, открытого в open_pos (с учётом вложенности)."""
+    depth = 0
+    k = open_pos
+    n = len(css_text)
+    while k < n:
+        j = _skip_comment_or_string(css_text, k)
+        if j != k:
+            k = j
+            continue
+        if css_text[k] == "{":
+            depth += 1
+        elif css_text[k] == "}":
+            depth -= 1
+            if depth == 0:
+                return k
+        k += 1
+    return n
+
+
+def parse_css(css_text: str) -> tuple:
+    """
+    Разбирает CSS один раз и возвращает (rules, at_rules) в порядке появления.
+
+    rules — обычные правила:
+      - selector: исходный селектор
+      - key: (контекст at-правил, нормализованный селектор)
+      - context: кортеж прелюдий внешних группирующих at-правил, например ("@media (max-width:640px)",)
+      - start, end: границы всего правила в css_text
+      - body_start, body_end: границы тела (между { и })
+
+    at_rules — негруппирующие at-правила целиком (@font-face{...}, @keyframes{...}, @import ...;):
+      - name, text, context, start, end
+
+    Комментарии и строки пропускаются, вложенные @media/@supports/@layer/@container учитываются.
+    """
+    rules = []
+    at_rules = []
+    context = []
+    prelude_start = 0
+    i = 0
+    n = len(css_text)
+
+    while i < n:
+        j = _skip_comment_or_string(css_text, i)
+        if j != i:
+            i = j
+            continue
+
+        ch = css_text[i]
+        if ch in "{;":
+            raw_prelude = css_text[prelude_start:i]
+            prelude = re.sub(r"/\*.*?\*/", "", raw_prelude, flags=re.DOTALL).strip()
+            start = prelude_start + len(raw_prelude) - len(raw_prelude.lstrip())
+
+        if ch == "{":
+            if prelude.startswith("@"):
+                if _at_rule_name(prelude) in GROUPING_AT_RULES:
+                    context.append(_ws_pattern.sub(" ", prelude))
+                    i += 1
+                    prelude_start = i
+                    continue
+
+                # Негруппирующее at-правило: забираем блок целиком
+                end = min(_find_block_end(css_text, i) + 1, n)
+                at_rules.append({
+                    "name": _at_rule_name(prelude),
+                    "text": css_text[start:end],
+                    "context": tuple(context),
+                    "start": start,
+                    "end": end
+                })
+                i = end
+                prelude_start = i
+                continue
+
+            # Обычное правило: ищем закрывающую скобку тела
+            body_start = i + 1
+            k = body_start
+            while k < n and css_text[k] != "}":
+                j = _skip_comment_or_string(css_text, k)
+                k = j if j != k else k + 1
+            body_end = min(k, n)
+            ctx = tuple(context)
+            rules.append({
+                "selector": prelude,
+                "key": (tuple(normalize_at_rule(p) for p in ctx), normalize_selector(prelude)),
+                "context": ctx,
+                "start": start,
+                "end": min(body_end + 1, n),
+                "body_start": body_start,
+                "body_end": body_end
+            })
+            i = body_end + 1
+            prelude_start = i
+            continue
+
+        if ch == "}":
+            if context:
+                context.pop()
+            i += 1
+            prelude_start = i
+            continue
+
+        if ch == ";":
+            # @import/@charset и т.п. — правило-инструкция без блока
+            if prelude.startswith("@"):
+                at_rules.append({
+                    "name": _at_rule_name(prelude),
+                    "text": css_text[start:i + 1],
+                    "context": tuple(context),
+                    "start": start,
+                    "end": i + 1
+                })
+            i += 1
+            prelude_start = i
+            continue
+
+        i += 1
+
+    return rules, at_rules
+
+
+def parse_css_rules(css_text: str) -> list:
+    """
+    Только обычные правила из parse_css (селектор + тело).
+    """
+    return parse_css(css_text)[0]
+
+
+def _split_declarations(body: str) -> list:
+    """
+    Разбивает тело правила на декларации с позициями значений внутри body:
+    [{"prop", "value", "value_start", "value_end"}].
+    Точки с запятой внутри скобок (url(data:...;...)) и строк не считаются разделителями.
+    """
+    chunks = []
+    depth = 0
+    current_start = 0
+    i = 0
+    n = len(body)
+
+    while i < n:
+        j = _skip_comment_or_string(body, i)
+        if j != i:
+            i = j
+            continue
+        ch = body[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif ch == ";" and depth == 0:
+            chunks.append((current_start, i))
+            current_start = i + 1
+        i += 1
+    chunks.append((current_start, n))
+
+    declarations = []
+    for start, end in chunks:
+        chunk = body[start:end]
+        if ":" not in re.sub(r"/\*.*?\*/", "", chunk, flags=re.DOTALL):
+            continue
+        colon = chunk.index(":")
+        prop = re.sub(r"/\*.*?\*/", "", chunk[:colon], flags=re.DOTALL).strip()
+        if not prop:
+            continue
+        raw_value = chunk[colon + 1:]
+        value_start = start + colon + 1 + len(raw_value) - len(raw_value.lstrip())
+        value_end = start + len(chunk.rstrip())
+        declarations.append({
+            "prop": prop,
+            "value": body[value_start:value_end],
+            "value_start": value_start,
+            "value_end": max(value_start, value_end)
+        })
+    return declarations
+
+
+def parse_declarations(body: str) -> list:
+    """
+    Разбивает тело правила на список (property, value).
+    """
+    return [(d["prop"], d["value"]) for d in _split_declarations(body)]
+
+
+def merge_declarations(old_body: str, new_declarations: list) -> str:
+    """
+    Сливает декларации на уровне свойств: в существующих свойствах заменяется
+    только диапазон значения, новые свойства дописываются в конец тела
+    в том же стиле форматирования (в одну строку или построчно).
+    """
+    existing = {d["prop"].lower(): d for d in _split_declarations(old_body)}
+    replacements = []
+    appended = []
+    for prop, value in new_declarations:
+        d = existing.get(prop.lower())
+        if d is None:
+            appended = [(p, v) for p, v in appended if p.lower() != prop.lower()]
+            appended.append((prop, value))
+        elif d["value"] != value:
+            replacements = [r for r in replacements if r[0] != d["value_start"]]
+            replacements.append((d["value_start"], d["value_end"], value))
+
+    body = old_body
+    if appended:
+        content_end = len(body.rstrip())
+        if "\n" in body:
+            indent_match = re.search(r"\n([ \t]*)\S", body)
+            indent = indent_match.group(1) if indent_match else "    "
+            addition = "".join(f"\n{indent}{p}: {v};" for p, v in appended)
+        else:
+            sep = " " if ": " in body or not body.strip() else ""
+            addition = "".join(f"{sep}{p}:{sep}{v};" for p, v in appended)
+            if not body.strip():
+                addition = addition.lstrip()
+        if content_end and body[content_end - 1] not in ";{":
+            addition = ";" + addition
+        body = body[:content_end] + addition + body[content_end:]
+
+    # Значения правим с конца — вставка в хвост их смещения не затрагивает
+    for start, end, value in sorted(replacements, reverse=True):
+        body = body[:start] + value + body[end:]
+    return body
+
+
+def _wrap_context(text: str, context: tuple) -> str:
+    for prelude in reversed(context):
+        text = f"{prelude} {{\n{text}\n}}"
+    return text
+
+
+def render_rule(selector: str, declarations: list, context: tuple = ()) -> str:
+    """
+    Собирает текст нового правила, оборачивая его во внешние at-правила.
+    """
+    body = "".join(f"\n    {p}: {v};" for p, v in declarations)
+    return _wrap_context(f"{selector} {{{body}\n}}", context)
+
+
+def merge_css_into_styles(style_texts: list, new_css: str) -> tuple:
+    """
+    Применяет все правила из new_css к текстам <style> за один проход.
+
+    Каждый текст разбирается один раз в индекс key -> (номер style, правило).
+    Для совпавших правил меняется только диапазон тела; несовпавшие правила
+    дописываются в конец последнего текста (или возвращаются отдельно, если
+    style-текстов нет). Негруппирующие at-правила (@font-face, @keyframes,
+    @import, ...) дописываются как есть, если точно такого же текста ещё нет.
+
+    Возвращает (новые тексты, список изменённых индексов, добавленный CSS, лог).
+    Лог — список (действие, селектор), где действие "update" или "add".
+    """
+    index = {}
+    for style_idx, text in enumerate(style_texts):
+        for rule in parse_css_rules(text):
+            # Последнее вхождение выигрывает в каскаде — в него и сливаем
+            index[rule["key"]] = (style_idx, rule)
+
+    edits = {}
+    additions = {}
+    log = []
+    new_rules, new_at_rules = parse_css(new_css)
+    for new_rule in new_rules:
+        declarations = parse_declarations(new_css[new_rule["body_start"]:new_rule["body_end"]])
+        if not declarations:
+            continue
+        found = index.get(new_rule["key"])
+        if found is None:
+            pending = additions.get(new_rule["key"])
+            if pending is None:
+                additions[new_rule["key"]] = (new_rule["selector"], new_rule["context"], declarations)
+            else:
+                pending[2].extend(declarations)
+            log.append(("add", new_rule["selector"]))
+            continue
+
+        style_idx, rule = found
+        span = (rule["body_start"], rule["body_end"])
+        style_edits = edits.setdefault(style_idx, {})
+        old_body = style_edits.get(span, style_texts[style_idx][span[0]:span[1]])
+        style_edits[span] = merge_declarations(old_body, declarations)
+        log.append(("update", new_rule["selector"]))
+
+    new_texts = list(style_texts)
+    for style_idx, style_edits in edits.items():
+        text = new_texts[style_idx]
+        # Правим с конца, чтобы смещения ещё не применённых диапазонов не сдвигались
+        for (start, end), body in sorted(style_edits.items(), reverse=True):
+            text = text[:start] + body + text[end:]
+        new_texts[style_idx] = text
+
+    added_blocks = [
+        render_rule(selector, dict(decls).items(), context)
+        for selector, context, decls in additions.values()
+    ]
+    for at_rule in new_at_rules:
+        if any(at_rule["text"] in text for text in style_texts):
+            continue
+        added_blocks.append(_wrap_context(at_rule["text"], at_rule["context"]))
+        log.append(("add", at_rule["text"].split("{", 1)[0].strip()))
+    added_css = "\n\n".join(added_blocks)
+    changed = sorted(edits)
+    if added_css and new_texts:
+        new_texts[-1] = new_texts[-1] + "\n\n" + added_css + "\n"
+        if len(new_texts) - 1 not in changed:
+            changed.append(len(new_texts) - 1)
+        added_css = ""
+
+    return new_texts, changed, added_css, log
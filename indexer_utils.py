@@ -1,64 +1,242 @@
 # indexer_utils.py
 
+import multiprocessing
 import os
 import re
+import sys
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
 
 css_rule_pattern = re.compile(r'(?P<selector>[^\{]+)\{(?P<body>[^\}]+)\}')
 
-def create_css_index(css_files: list) -> list:
+def _map_files(func, files: list, max_workers: int = None) -> list:
+    """
+    Применяет func к каждому файлу и возвращает результаты в исходном порядке.
+    При max_workers > 1 файлы раздаются по одному на воркер ProcessPoolExecutor,
+    иначе обработка идёт последовательно в текущем процессе.
+
+    Пул нужен только для холодной индексации многих файлов (прогрев, массовая
+    переиндексация): на десятке файлов запуск воркеров дороже самой работы.
+    Воркеры стартуют через spawn — fork из многопоточного сервера может зависнуть.
+    """
+    if not max_workers or max_workers <= 1 or len(files) <= 1:
+        return [func(f) for f in files]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        return list(pool.map(func, files))
+
+
+# Поля правила в плоском массиве смещений (по RULE_FIELDS чисел на правило)
+_SEL_START, _SEL_END, _BODY_START, _BODY_END, _RULE_START, _RULE_END, _START_LINE = range(7)
+RULE_FIELDS = 7
+# Ключи, доступные через rule["..."] — те же, что в to_dict()
+CSS_RULE_KEYS = frozenset(("id", "filename", "selector", "body", "start_line", "end_line", "original_text"))
+
+
+class CssRule:
+    """
+    Лёгкое представление одного правила CSS-индекса. Ничего не копирует:
+    selector, body и original_text вырезаются из исходного текста файла по смещениям.
+    Поддерживает доступ как к словарю (rule["selector"]) для старого кода.
+    """
+    __slots__ = ("_index", "_pos")
+
+    def __init__(self, index, pos: int):
+        self._index = index
+        self._pos = pos
+
+    def _field(self, field: int) -> int:
+        return self._index._offsets[self._pos * RULE_FIELDS + field]
+
+    def _slice(self, start_field: int, end_field: int) -> str:
+        text = self._index._texts[self._index._file_of[self._pos]]
+        return text[self._field(start_field):self._field(end_field)]
+
+    @property
+    def id(self) -> int:
+        return self._pos + 1
+
+    @property
+    def filename(self) -> str:
+        return self._index._filenames[self._index._file_of[self._pos]]
+
+    @property
+    def selector(self) -> str:
+        return self._slice(_SEL_START, _SEL_END)
+
+    @property
+    def body(self) -> str:
+        return self._slice(_BODY_START, _BODY_END)
+
+    @property
+    def original_text(self) -> str:
+        return self._slice(_RULE_START, _RULE_END)
+
+    @property
+    def start_line(self) -> int:
+        return self._field(_START_LINE)
+
+    @property
+    def end_line(self) -> int:
+        return self._field(_START_LINE)  # или приблизительно: start_line + 1
+
+    def __getitem__(self, key: str):
+        if key not in CSS_RULE_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "selector": self.selector,
+            "body": self.body,
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "original_text": self.original_text
+        }
+
+
+class CssIndex:
+    """
+    Компактный CSS-индекс: исходный текст каждого файла хранится один раз,
+    имена файлов интернируются, а правила — это смещения в array('I').
+    id правила — его порядковый номер (с 1) в порядке добавления файлов.
+    """
+    __slots__ = ("_filenames", "_texts", "_file_of", "_offsets")
+
+    def __init__(self):
+        self._filenames = []
+        self._texts = []
+        self._file_of = array("I")
+        self._offsets = array("I")
+
+    def add_file(self, indexed_file: dict):
+        """Добавляет результат index_css_file."""
+        if not indexed_file:
+            return
+        file_no = len(self._filenames)
+        self._filenames.append(sys.intern(indexed_file["filename"]))
+        self._texts.append(indexed_file["text"])
+        offsets = indexed_file["offsets"]
+        self._offsets.extend(offsets)
+        self._file_of.extend([file_no] * (len(offsets) // RULE_FIELDS))
+
+    def __len__(self) -> int:
+        return len(self._file_of)
+
+    def __getitem__(self, pos: int) -> CssRule:
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return CssRule(self, pos)
+
+    def __iter__(self):
+        return self.iter_rules()
+
+    def iter_rules(self, selector_pattern=None):
+        """
+        Перебирает правила по порядку id. selector_pattern (строка или
+        скомпилированный regex) оставляет только правила с подходящим селектором.
+        """
+        if isinstance(selector_pattern, str):
+            selector_pattern = re.compile(selector_pattern)
+        for pos in range(len(self)):
+            rule = CssRule(self, pos)
+            if selector_pattern is None or selector_pattern.search(rule.selector):
+                yield rule
+
+
+def _strip_span(text: str, start: int, end: int) -> tuple:
+    """Смещения подстроки text[start:end] без пробелов по краям."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def index_css_file(cssfile: str) -> dict:
+    """
+    Индексирует один CSS-файл. Возвращает None, если файла нет, иначе
+    {"filename", "text", "offsets"}, где offsets — array('I') по RULE_FIELDS
+    чисел на правило. id проставляются при слиянии в CssIndex, чтобы быть стабильными.
+    """
+    if not os.path.exists(cssfile):
+        return None
+
+    with open(cssfile, "r", encoding="utf-8", errors="ignore") as f:
+        full_text = f.read()
+
+    # Накопленные длины строк — для поиска номера строки бинарным поиском
+    line_ends = list(accumulate(len(line) for line in full_text.splitlines(keepends=True)))
+
+    offsets = array("I")
+    for match in css_rule_pattern.finditer(full_text):
+        sel_start, sel_end = _strip_span(full_text, *match.span("selector"))
+        body_start, body_end = _strip_span(full_text, *match.span("body"))
+
+        # Определяем приблизительную позицию (номер строки)
+        start_line = min(bisect_left(line_ends, match.start()), max(len(line_ends) - 1, 0)) + 1
+
+        offsets.extend((
+            sel_start, sel_end,
+            body_start, body_end,
+            match.start(), match.end(),
+            start_line
+        ))
+    return {"filename": cssfile, "text": full_text, "offsets": offsets}
+
+
+def merge_css_records(per_file_records: list) -> CssIndex:
+    """
+    Склеивает результаты index_css_file (в порядке файлов) в один CssIndex;
+    id идут сквозные, начиная с 1.
+    """
+    css_index = CssIndex()
+    for indexed_file in per_file_records:
+        css_index.add_file(indexed_file)
+    return css_index
+
+
+def create_css_index(css_files: list, max_workers: int = None) -> CssIndex:
     """
     Проходит по каждому CSS-файлу, ищет правила вида:
       selector { body }
-    Возвращает список записей, каждая запись содержит:
+    Возвращает CssIndex; каждое правило (CssRule) даёт:
       - id (уникальный, для ссылки в LLM)
       - filename (откуда правило)
       - selector, body
       - start_line, end_line (приблизительно)
       - original_text (полное правило)
+
+    max_workers > 1 включает параллельную индексацию по процессам;
+    id от этого не зависят — они идут в порядке css_files.
     """
-    css_index = []
-    global_id = 1
-
-    for cssfile in css_files:
-        if not os.path.exists(cssfile):
-            continue
-        
-        with open(cssfile, "r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-        full_text = "".join(lines)
-
-        matches = list(css_rule_pattern.finditer(full_text))
-        for match in matches:
-            sel = match.group("selector").strip()
-            bod = match.group("body").strip()
-            original_text = match.group(0)
-
-            # Определяем приблизительную позицию (номер строки)
-            start_char = match.start()
-            start_line = 1
-            current_count = 0
-            for i, line in enumerate(lines, start=1):
-                current_count += len(line)
-                if current_count >= start_char:
-                    start_line = i
-                    break
-            end_line = start_line  # или приблизительно: start_line + 1
-
-            record = {
-                "id": global_id,
-                "filename": cssfile,
-                "selector": sel,
-                "body": bod,
-                "start_line": start_line,
-                "end_line": end_line,
-                "original_text": original_text
-            }
-            css_index.append(record)
-            global_id += 1
+    return merge_css_records(_map_files(index_css_file, css_files, max_workers))
 
-    return css_index
 
-def render_css_index_for_llm(css_index: list) -> str:
+def index_js_file(jsfile: str) -> dict:
+    """
+    Считывает один JS-файл и режет его на строки для поиска по id/классам.
+    """
+    if not os.path.exists(jsfile):
+        return {"filename": jsfile, "lines": []}
+    with open(jsfile, "r", encoding="utf-8", errors="ignore") as f:
+        return {"filename": jsfile, "lines": f.read().split("\n")}
+
+
+def create_js_index(js_files: list) -> list:
+    """
+    Считывает JS-файлы последовательно (это чтение с диска, а не CPU-работа —
+    процессный пул здесь только замедляет). Порядок записей совпадает с порядком js_files.
+    """
+    return [rec for rec in map(index_js_file, js_files) if rec["lines"]]
+
+def render_css_index_for_llm(css_index: CssIndex) -> str:
     """
     Создает текстовое представление CSS-индекса для LLM.
     Каждая запись выводится примерно так:
@@ -70,13 +248,54 @@ def render_css_index_for_llm(css_index: list) -> str:
       Lines: <start_line>-<end_line>
     """
     lines = []
-    for rec in css_index:
-        lines.append(f"=== CSS Rule #{rec['id']}")
-        lines.append(f"File: {rec['filename']}")
-        lines.append(f"Selector: {rec['selector']}")
+    for rule in css_index.iter_rules():
+        lines.append(f"=== CSS Rule #{rule.id}")
+        lines.append(f"File: {rule.filename}")
+        lines.append(f"Selector: {rule.selector}")
         lines.append("Body:")
-        for b in rec["body"].splitlines():
+        for b in rule.body.splitlines():
             lines.append("  " + b)
-        lines.append(f"Lines: {rec['start_line']}-{rec['end_line']}")
+        lines.append(f"Lines: {rule.start_line}-{rule.end_line}")
         lines.append("")
     return "\n".join(lines).strip()
+
+
+def render_css_summary_for_llm(css_index: CssIndex, max_chars: int = 40000) -> str:
+    """
+    Компактная сводка CSS-индекса для статичного префикса prompt:
+    по каждому файлу — id и селекторы правил, без тел.
+
+      File: <filename> (<N> правил)
+        #<id> <selector>
+        … ещё <K> правил
+
+    Полный индекс (render_css_index_for_llm) на реальном сайте занимает
+    миллионы символов и не помещается в контекст модели. Здесь на каждый
+    файл отводится равная доля max_chars; правила сверх доли только считаются.
+    Тела правил, относящихся к выбранному элементу, всё равно приходят
+    в секции «Связанный CSS», так что модель теряет лишь тела посторонних
+    правил и селекторы, не попавшие в лимит.
+    """
+    by_file = {}
+    for rule in css_index.iter_rules():
+        by_file.setdefault(rule.filename, []).append(rule)
+    if not by_file:
+        return ""
+
+    share = max(max_chars // len(by_file), 1)
+    lines = []
+    for filename, rules in by_file.items():
+        lines.append(f"File: {filename} ({len(rules)} правил)")
+        used = 0
+        shown = 0
+        for rule in rules:
+            line = f"  #{rule.id} {' '.join(rule.selector.split())}"
+            if used + len(line) + 1 > share:
+                break
+            lines.append(line)
+            used += len(line) + 1
+            shown += 1
+        if shown < len(rules):
+            lines.append(f"  … ещё {len(rules) - shown} правил")
+    return "\n".join(lines)
+
@@ -0,0 +1,24 @@
+# json_codec.py
+"""
+JSON-модуль для python-socketio (параметр json=). Использует orjson, если он
+установлен, иначе — стандартный json.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+
+def dumps(obj, **kwargs) -> str:
+    # socketio передаёт separators=... — orjson и так пишет компактно
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(s, **kwargs):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s, **kwargs)
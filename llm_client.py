@@ -1,23 +1,174 @@
-from openai import OpenAI
 from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import os
+import re
+import time
 
 load_dotenv()
 
-def call_llm(prompt: str) -> str:
-    client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    )
+# Модели: быстрая — для мелких правок стилей, основная — для всего остального
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "meta-llama/llama-4-maverick:free")
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "meta-llama/llama-4-scout:free")
+
+# Общий таймаут на запрос и задержка хеджа, пока нет статистики по модели
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+DEFAULT_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "8"))
+MIN_LATENCY_SAMPLES = 5
+
+SMALL_SNIPPET_CHARS = 600
+# Основы привязаны к началу слова: «фон» не должен находиться в «телефон»
+STYLE_COMMAND_PATTERN = re.compile(
+    r"\b(?:цвет|красн|зел[её]н|син|ч[её]рн|бел|темн|светл|ярч|бледн|размер|крупн|мельч|"
+    r"шрифт|жирн|курсив|подчерк|отступ|выравн|по центру|слева|справа|прозрачн|фон|рамк|скругл|"
+    r"colou?r|bigger|smaller|darker|lighter|bold|italic|font|size|margin|padding|align|background|border)",
+    re.IGNORECASE
+)
+
+_latencies = {}
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+_client = None
 
-    completion = client.chat.completions.create(
-        model="meta-llama/llama-4-maverick:free",
+
+def _get_client():
+    # Один клиент на процесс — переиспользуем пул соединений.
+    # openai импортируется здесь, чтобы не тормозить старт сервера.
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(
+            base_url="https://openrouter.ai/api/v1",
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+        )
+    return _client
+
+
+def openrouter_backend(prompt: str, model: str, timeout: float) -> tuple[str, dict]:
+    """
+    Бэкенд по умолчанию: OpenRouter через OpenAI SDK.
+    Возвращает (ответ, usage) — usage содержит prompt_tokens, completion_tokens, cached_tokens.
+    """
+    completion = _get_client().chat.completions.create(
+        model=model,
         messages=[
             {
             "role": "user",
             "content": prompt
             }
-        ]
+        ],
+        timeout=timeout
     )
-    return str(completion.choices[0].message.content)
 
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    if completion.usage is not None:
+        usage["prompt_tokens"] = completion.usage.prompt_tokens or 0
+        usage["completion_tokens"] = completion.usage.completion_tokens or 0
+        details = getattr(completion.usage, "prompt_tokens_details", None)
+        usage["cached_tokens"] = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    return str(completion.choices[0].message.content), usage
+
+
+_backend = openrouter_backend
+
+
+def warm_up_connection():
+    """
+    Создаёт клиента и открывает соединение с провайдером лёгким запросом,
+    чтобы первый пользовательский запрос не платил за импорт SDK и TLS-рукопожатие.
+    Проба с коротким таймаутом и без повторов: зависший провайдер не должен
+    держать инстанс вне ротации (умолчание SDK — 600 с и 2 повтора).
+    """
+    if _backend is not openrouter_backend:
+        return
+    _get_client().with_options(timeout=min(LLM_TIMEOUT, 10), max_retries=0).models.list()
+
+
+def set_backend(backend):
+    """
+    Подменяет бэкенд LLM. backend(prompt, model, timeout) -> (text, usage).
+    Позволяет прогонять маршрутизацию и хеджирование на локальной заглушке.
+    """
+    global _backend
+    _backend = backend
+
+
+def record_latency(model: str, seconds: float):
+    _latencies.setdefault(model, deque(maxlen=100)).append(seconds)
+
+
+def p95_latency(model: str) -> float:
+    """
+    p95 задержки успешных ответов модели; None, если статистики пока мало.
+    """
+    samples = _latencies.get(model)
+    if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def is_small_edit(user_command: str, snippet: str = "") -> bool:
+    """
+    Мелкая правка стиля: команда про цвет/размер/шрифт/отступы и небольшой фрагмент.
+    """
+    return len(snippet) <= SMALL_SNIPPET_CHARS and bool(STYLE_COMMAND_PATTERN.search(user_command))
+
+
+def choose_model(user_command: str = "", snippet: str = "") -> str:
+    return FAST_MODEL if user_command and is_small_edit(user_command, snippet) else DEFAULT_MODEL
+
+
+def _timed_call(prompt: str, model: str, timeout: float) -> tuple[str, dict]:
+    started = time.monotonic()
+    text, usage = _backend(prompt, model, timeout)
+    if text and text.strip():
+        record_latency(model, time.monotonic() - started)
+    return text, usage
+
+
+def call_llm_with_usage(prompt: str, model: str = None, hedge: bool = True) -> tuple[str, dict]:
+    """
+    Вызывает LLM с общим таймаутом LLM_TIMEOUT и хеджированием хвостовых задержек:
+    если ответ не пришёл за p95 задержки модели (или DEFAULT_HEDGE_DELAY, пока нет
+    статистики), отправляется дубликат запроса и берётся первый валидный (непустой) ответ.
+
+    Возвращает (ответ, usage) — usage содержит prompt_tokens, completion_tokens, cached_tokens.
+    cached_tokens — сколько токенов prompt было взято из prompt-кэша провайдера.
+    """
+    model = model or DEFAULT_MODEL
+    deadline = time.monotonic() + LLM_TIMEOUT
+    pending = {_executor.submit(_timed_call, prompt, model, LLM_TIMEOUT)}
+    hedge_delay = p95_latency(model) or DEFAULT_HEDGE_DELAY
+    hedged = not hedge
+    last_error = None
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        wait_for = remaining if hedged else min(hedge_delay, remaining)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            try:
+                text, usage = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if text and text.strip():
+                return text, usage
+            last_error = ValueError(f"Пустой ответ от модели {model}")
+
+        if not hedged and (not done or not pending):
+            # Основной запрос тормозит или уже упал — отправляем дубликат
+            print(f"[⏱] Хедж-запрос к {model} после {hedge_delay:.1f} с")
+            pending.add(_executor.submit(_timed_call, prompt, model, max(deadline - time.monotonic(), 1)))
+            hedged = True
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise TimeoutError(f"LLM {model} не ответила за {LLM_TIMEOUT:.0f} с")
+
+
+def call_llm(prompt: str, model: str = None) -> str:
+    return call_llm_with_usage(prompt, model=model)[0]
@@ -0,0 +1,246 @@
+# llm_validation.py
+import re
+from html.parser import HTMLParser
+
+from css_merge import parse_css, parse_declarations
+from pars_llm_ansver import parse_llm_response
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr"
+}
+# Теги с необязательным закрывающим тегом: открытие тега из набора закрывает
+# незакрытый тег-ключ (<li>a<li>b), как это делает браузер
+IMPLIED_END = {
+    "li": {"li"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "p": {"p"},
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "tr": {"td", "th", "tr"},
+    "option": {"option"},
+}
+OPTIONAL_END_TAGS = set(IMPLIED_END)
+# Атрибуты, по которым элемент потом ищется в DOM — их LLM менять не должна
+KEY_ATTRS = ("id", "field")
+
+# Проверяются только секции, которые реально применяются к файлам
+SECTION_TITLES = {
+    "new_html": "New HTML Block",
+    "new_css": "Additional CSS"
+}
+
+_fence_pattern = re.compile(r"^\s*```[\w-]*\s*\n?|\n?\s*```\s*$")
+_empty_markers = {"", '""', "''", "—", "-", "нет", "none"}
+
+
+def strip_code_fences(text: str) -> str:
+    """Убирает обёртку ```lang ... ```, которую LLM часто добавляет вокруг кода."""
+    return _fence_pattern.sub("", text).strip()
+
+
+def is_empty_section(text: str) -> bool:
+    return text.strip().lower() in _empty_markers
+
+
+class _HtmlChecker(HTMLParser):
+    """Проверяет баланс тегов и собирает корневые элементы фрагмента."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.roots = []
+        self.errors = []
+        self.stray_text = False
+
+    def handle_starttag(self, tag, attrs):
+        while self.stack and self.stack[-1] in OPTIONAL_END_TAGS and tag in IMPLIED_END[self.stack[-1]]:
+            self.stack.pop()
+        if not self.stack:
+            self.roots.append((tag, dict(attrs)))
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.stack:
+            self.roots.append((tag, dict(attrs)))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        # </ul> закрывает и незакрытый <li> внутри него
+        if tag in self.stack:
+            while self.stack[-1] != tag and self.stack[-1] in OPTIONAL_END_TAGS:
+                self.stack.pop()
+        if not self.stack or self.stack[-1] != tag:
+            self.errors.append(f"лишний или несогласованный закрывающий тег </{tag}>")
+            if tag in self.stack:
+                while self.stack.pop() != tag:
+                    pass
+            return
+        self.stack.pop()
+
+    def handle_data(self, data):
+        if not self.stack and data.strip():
+            self.stray_text = True
+
+
+def validate_html(new_html: str, original_html: str = "") -> list:
+    """
+    Проверяет новый HTML-блок:
+      - не пустой и с одним корневым элементом;
+      - все теги закрыты и вложены корректно;
+      - тег и ключевые атрибуты (id, field, data-*) исходного элемента сохранены.
+    Возвращает список ошибок (пустой — всё в порядке).
+    """
+    if is_empty_section(new_html):
+        return ["HTML-блок пустой"]
+
+    checker = _HtmlChecker()
+    checker.feed(new_html)
+    checker.close()
+    errors = list(checker.errors)
+    unclosed = [t for t in checker.stack if t not in OPTIONAL_END_TAGS]
+    if unclosed:
+        errors.append("не закрыты теги: " + ", ".join(f"<{t}>" for t in unclosed))
+    if checker.stray_text:
+        errors.append("текст вне корневого элемента")
+    if len(checker.roots) != 1:
+        errors.append(f"ожидался один корневой элемент, найдено {len(checker.roots)}")
+
+    if original_html and checker.roots:
+        original = _HtmlChecker()
+        original.feed(original_html)
+        original.close()
+        if original.roots:
+            old_tag, old_attrs = original.roots[0]
+            new_tag, new_attrs = checker.roots[0]
+            if new_tag != old_tag:
+                errors.append(f"тег изменён: <{old_tag}> → <{new_tag}>")
+            for name, value in old_attrs.items():
+                if (name in KEY_ATTRS or name.startswith("data-")) and new_attrs.get(name) != value:
+                    errors.append(f"атрибут {name}=\"{value}\" не сохранён")
+
+    return errors
+
+
+def _unbalanced(text: str, pairs: dict) -> str:
+    """
+    Проверяет баланс скобок, пропуская строки и комментарии.
+    Возвращает описание первой ошибки или пустую строку.
+    """
+    closing = {v: k for k, v in pairs.items()}
+    stack = []
+    quotes = "\"'"
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end == -1:
+                return "незакрытый комментарий"
+            i = end + 2
+            continue
+        if ch in quotes:
+            j = i + 1
+            while j < n and text[j] != ch:
+                if text[j] == "\n":
+                    return "незакрытая строка"
+                j += 2 if text[j] == "\\" else 1
+            if j >= n:
+                return "незакрытая строка"
+            i = j + 1
+            continue
+        if ch in pairs:
+            stack.append(ch)
+        elif ch in closing:
+            if not stack or stack[-1] != closing[ch]:
+                return f"лишняя скобка «{ch}»"
+            stack.pop()
+        i += 1
+    if stack:
+        return f"не закрыта скобка «{stack[-1]}»"
+    return ""
+
+
+def validate_css(new_css: str) -> list:
+    """
+    Проверяет, что CSS разбирается: скобки сбалансированы, у каждого правила
+    есть селектор и хотя бы одна декларация вида property: value.
+    At-правила (@font-face, @keyframes, @import ...) принимаются как есть.
+    """
+    if is_empty_section(new_css):
+        return []
+    error = _unbalanced(new_css, {"{": "}", "(": ")"})
+    if error:
+        return [error]
+
+    rules, at_rules = parse_css(new_css)
+    if not rules and not at_rules:
+        return ["не найдено ни одного CSS-правила"]
+    errors = []
+    for rule in rules:
+        if not rule["selector"]:
+            errors.append("правило без селектора")
+        elif not parse_declarations(new_css[rule["body_start"]:rule["body_end"]]):
+            errors.append(f"в правиле «{rule['selector']}» нет деклараций")
+    return errors
+
+
+def validate_llm_response(parsed: dict, original_html: str = "") -> dict:
+    """
+    Нормализует секции ответа (убирает ```-обёртки) и проверяет их до любых записей в файлы.
+    Возвращает словарь секция -> список ошибок только для непрошедших секций.
+    parsed изменяется на месте.
+    """
+    for key in SECTION_TITLES:
+        parsed[key] = strip_code_fences(parsed.get(key, ""))
+
+    errors = {
+        "new_html": validate_html(parsed["new_html"], original_html),
+        "new_css": validate_css(parsed["new_css"])
+    }
+    return {k: v for k, v in errors.items() if v}
+
+
+def build_repair_prompt(section: str, content: str, errors: list, user_command: str, original_html: str) -> str:
+    """
+    Короткий prompt на исправление одной секции ответа.
+    """
+    title = SECTION_TITLES[section]
+    return (
+        f"Исправь секцию «{title}» ответа на команду пользователя: {user_command}\n\n"
+        f"Исходный HTML-элемент:\n{original_html.strip()}\n\n"
+        f"Текущая версия секции:\n{content.strip() or '(пусто)'}\n\n"
+        "Ошибки:\n" + "\n".join(f"- {e}" for e in errors) + "\n\n"
+        f"Верни только исправленный код в формате:\n### {title}\n<...>\n"
+    )
+
+
+def validate_and_repair(
+    parsed: dict,
+    original_html: str,
+    user_command: str,
+    llm,
+    max_attempts: int = 1
+) -> dict:
+    """
+    Проверяет ответ LLM и переспрашивает только непрошедшие секции коротким prompt.
+    llm — функция prompt -> ответ (например, llm_client.call_llm).
+
+    Возвращает словарь оставшихся ошибок по секциям (пустой — можно применять).
+    """
+    errors = validate_llm_response(parsed, original_html)
+    for _ in range(max_attempts):
+        if not errors:
+            break
+        for section, section_errors in errors.items():
+            print(f"⚠️ Секция {section} не прошла проверку: {section_errors}")
+            prompt = build_repair_prompt(section, parsed[section], section_errors, user_command, original_html)
+            fixed = parse_llm_response(llm(prompt))[section]
+            if fixed:
+                parsed[section] = fixed
+        errors = validate_llm_response(parsed, original_html)
+    return errors
@@ -1,60 +1,153 @@
 from pathlib import Path
-from parser_utils import (
-    parse_project_simple,
-    load_all_css,
-    load_all_js,
-    analyze_dom_and_collect_context
+from parser_utils import analyze_dom_and_collect_context
+from site_index import get_css_index_text, get_site_index, site_lock
+from context_builder import (
+    PROMPT_LAYOUT,
+    build_cached_prompt,
+    build_detailed_prompt,
+    build_element_sections,
+    build_followup_prompt,
+    build_prompt_prefix,
+    save_full_context_to_file
 )
-from indexer_utils import create_css_index, render_css_index_for_llm
-from context_builder import build_detailed_prompt, save_full_context_to_file
 from pars_llm_ansver import parse_llm_response
-from llm_client import call_llm
+from llm_validation import validate_and_repair
+from llm_client import call_llm, call_llm_with_usage, choose_model
+from prompt_metrics import record_prompt_usage
 from replace_script import apply_html_change, apply_css_change_to_html
 
-def main(user_command: str, snippets: list[str]):
+
+# 🔹 Папка с выгрузкой сайта (где лежат все проекты с HTML)
+ROOT_PATH = "D:/1 My Work/2 ML/Workes/client_hack/ai-generator-dizmaketov/extractor/output/do-doors.ru/index.html"
+
+
+def prepare_context(snippets: list[str], root_path: str = ROOT_PATH) -> dict:
+    """
+    Всё, что не зависит от команды пользователя: поиск элемента, родители,
+    связанный CSS/JS, CSS-индекс и префикс prompt. Можно вызвать заранее,
+    как только пользователь выделил элементы (см. событие select в server.py).
+
+    Возвращает None, если элемент не найден.
+    """
     # 🔹 Собираем сниппеты в одну строку
     combined_snippet = "\n".join(snippets)
 
-    # 🔹 Папка с выгрузкой сайта (где лежат все проекты с HTML)
-    root_path = "D:/1 My Work/2 ML/Workes/client_hack/ai-generator-dizmaketov/extractor/output/do-doors.ru/index.html"
-
-    # 🔹 Ищем index.html и связанные файлы
-    proj = parse_project_simple(root_path)
+    # 🔹 Ищем index.html и связанные файлы (индекс сайта кэшируется после первого запроса)
+    site = get_site_index(root_path)
+    proj = site["project"]
     index_html_path = proj["index_html"]
     index_path = Path(index_html_path)
 
-    # 🔹 Загружаем CSS и JS
-    css_dir = index_path.parent / "css"
-    all_css = load_all_css(str(css_dir))
-    all_js = load_all_js(proj["js_files"])
-
-    # 🔹 Анализируем DOM и собираем контекст
-    context_data = analyze_dom_and_collect_context(
-        index_html=str(index_path),
-        all_css=all_css,
-        all_js=all_js,
-        selected_snippet=combined_snippet
-    )
+    # 🔹 Анализируем DOM и собираем контекст (JS уже разбит на строки в индексе сайта;
+    #    all_css не используется — связанный CSS берётся из <style> в index.html)
+    with site_lock(root_path):
+        context_data = analyze_dom_and_collect_context(
+            index_html=str(index_path),
+            all_css="",
+            all_js=site["js_lines"],
+            selected_snippet=combined_snippet
+        )
     save_full_context_to_file(context_data, "context_summary.txt")
 
     if not context_data["found_element"]:
         print("❌ Элемент не найден в index.html")
-        return
-
-    # 🔹 Индексируем CSS
-    css_index = create_css_index(proj["css_files"])
-    css_index_str = render_css_index_for_llm(css_index)
-
-    # 🔹 Строим prompt и отправляем в LLM
-    prompt_text = build_detailed_prompt(
-        user_command=user_command,
-        snippet=context_data["found_element"],
-        parents=context_data["html_parents"],
-        related_css=context_data["related_css"],
-        related_js=context_data["related_js"],
-        css_index_str=css_index_str
-    )
-    llm_answer = call_llm(prompt_text)
+        return None
+
+    # 🔹 CSS-индекс (текст и версия считаются один раз на индекс сайта)
+    css_index_str, index_version = get_css_index_text(site)
+
+    # 🔹 Секции элемента и префикс prompt (всё, кроме команды и инструкций)
+    element_context = {
+        "snippet": context_data["found_element"],
+        "parents": context_data["html_parents"],
+        "related_css": context_data["related_css"],
+        "related_js": context_data["related_js"]
+    }
+    element_sections = build_element_sections(**element_context)
+    prompt_prefix = build_prompt_prefix(**element_context)
+
+    return {
+        "snippets": list(snippets),
+        "root_path": root_path,
+        "index_path": index_path,
+        "context_data": context_data,
+        "css_index_str": css_index_str,
+        "index_version": index_version,
+        "element_sections": element_sections,
+        "prompt_prefix": prompt_prefix
+    }
+
+
+def is_followup(session: dict, snippets: list[str]) -> bool:
+    """
+    Повторная правка того же элемента: в сессии есть результат прошлой правки,
+    а выделен тот же элемент (исходный или уже изменённый) или ничего.
+    """
+    if not session or not session.get("element_html"):
+        return False
+    combined = "\n".join(snippets).strip()
+    return not combined or combined in (session["element_html"].strip(), session["source_snippet"].strip())
+
+
+def main(
+    user_command: str,
+    snippets: list[str],
+    prepared: dict = None,
+    session: dict = None,
+    on_progress=None
+):
+    # 🔹 on_progress(stage) — необязательный колбэк для промежуточных статусов клиенту
+    report = on_progress or (lambda stage: None)
+    prefix_version = "-"
+    prefix_chars = 0
+    if is_followup(session, snippets):
+        # 🔹 Повторная правка: компактный prompt из результата прошлой правки
+        root_path = session["root_path"]
+        index_path = session["index_path"]
+        current_html = session["element_html"]
+        prompt_text = build_followup_prompt(
+            user_command=user_command,
+            previous_command=session["last_command"],
+            current_html=current_html,
+            previous_css=session["last_css"]
+        )
+    else:
+        # 🔹 Контекст мог быть подготовлен заранее (prefetch по выделению)
+        if prepared is None or prepared["snippets"] != list(snippets):
+            report("context")
+            prepared = prepare_context(snippets)
+        if prepared is None:
+            return
+
+        root_path = prepared["root_path"]
+        index_path = prepared["index_path"]
+        context_data = prepared["context_data"]
+        current_html = context_data["found_element"]
+        print(f"Вот родительский элемент: {context_data['html_parents']}")
+
+        # 🔹 Строим prompt и отправляем в LLM
+        if PROMPT_LAYOUT == "cached":
+            # Статичный префикс сайта (инструкции + CSS-индекс) идёт первым — для prompt-кэша провайдера
+            cached_prompt = build_cached_prompt(
+                user_command=user_command,
+                element_sections=prepared["element_sections"],
+                css_index_str=prepared["css_index_str"],
+                index_version=prepared["index_version"]
+            )
+            prompt_text = cached_prompt["text"]
+            prefix_version = cached_prompt["prefix_version"]
+            prefix_chars = cached_prompt["prefix_chars"]
+        else:
+            prompt_text = build_detailed_prompt(
+                user_command=user_command,
+                css_index_str=prepared["css_index_str"],
+                prompt_prefix=prepared["prompt_prefix"]
+            )
+    # 🔹 Мелкие правки стилей уходят в быструю модель
+    model = choose_model(user_command, current_html)
+    report("llm")
+    llm_answer, usage = call_llm_with_usage(prompt_text, model=model)
+    record_prompt_usage(prefix_version, prefix_chars, usage)
     print(f'Вот изначальные ответ ллм: {llm_answer}')
 
     def recall_ansver(prompt) -> str:
@@ -80,19 +173,57 @@ def main(user_command: str, snippets: list[str]):
         ### Explanation
         "Команда пользователя требует изменить цвет текста на зеленый. Поскольку исходный HTML-блок содержал инлайновый стиль, наиболее простым способом выполнить команду было изменить этот стиль напрямую, добавив `color: green`."
         '''
-        return call_llm(rec_prompt)
+        return call_llm(rec_prompt, model=model)
 
     final_answer = recall_ansver(llm_answer)
     print(f"Вот конечный ответ от ллм: {final_answer}")
 
     parsed = parse_llm_response(final_answer)
     print(f"Вот спарсенный ответ: {parsed}")
-    print(f"Вот родительский элемент: {context_data['html_parents']}")
-
-    # 🔹 HTML: обновляем блок в файле
-    apply_html_change(root_path, context_data["found_element"], parsed["new_html"])
-
-    # 🔹 CSS: обновляем <style> внутри HTML
-    apply_css_change_to_html(str(index_path.parent), parsed["new_css"])
 
+    # 🔹 Проверяем ответ до записи в файлы; непрошедшие секции переспрашиваем точечно
+    report("validate")
+    errors = validate_and_repair(parsed, current_html, user_command, call_llm)
+
+    report("apply")
+    html_applied = False
+    css_applied = False
+    not_applied = []
+    # 🔹 Правки одного index.html из разных сессий применяются по очереди
+    with site_lock(root_path):
+        # 🔹 HTML: обновляем блок в файле
+        if "new_html" in errors:
+            print(f"❌ HTML не применён: {errors['new_html']}")
+            not_applied.append("HTML — " + "; ".join(errors["new_html"]))
+        else:
+            html_applied = apply_html_change(root_path, current_html, parsed["new_html"])
+            if not html_applied:
+                not_applied.append("HTML — исходный блок не найден в файле")
+
+        # 🔹 CSS: обновляем <style> внутри HTML (пустая секция — просто нет правок CSS)
+        if "new_css" in errors:
+            print(f"❌ CSS не применён: {errors['new_css']}")
+            not_applied.append("CSS — " + "; ".join(errors["new_css"]))
+        else:
+            css_applied = apply_css_change_to_html(str(index_path), parsed["new_css"])
+
+    # 🔹 Запоминаем результат для следующей правки того же элемента. Если ничего
+    #    не записано, сессию не трогаем — следующая команда соберёт полный контекст
+    if session is not None and (html_applied or css_applied):
+        if not is_followup(session, snippets):
+            session["source_snippet"] = "\n".join(snippets)
+            session["last_css"] = ""
+        session["root_path"] = root_path
+        session["index_path"] = index_path
+        session["element_html"] = parsed["new_html"] if html_applied else current_html
+        session["last_command"] = user_command
+        if css_applied and parsed["new_css"]:
+            session["last_css"] = parsed["new_css"]
+
+    # 🔹 Пользователь должен видеть, что правка (или её часть) не записана
+    if not_applied:
+        report_text = "❌ Не применено:\n" + "\n".join(f"- {item}" for item in not_applied)
+        if not (html_applied or css_applied):
+            return report_text
+        return f"{parsed['explanation']}\n\n{report_text}".strip()
     return parsed["explanation"]
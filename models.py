@@ -1,30 +1,48 @@
 # models.py
-from pydantic import BaseModel
-from typing import Literal
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Literal
 from uuid import uuid4
 from time import time
 
 
 MessageRole = Literal["user", "bot"]
 
+# Ограничения на размер входящих сообщений — проверяются прямо в валидаторе
+MAX_COMMAND_CHARS = 4_000
+MAX_SNIPPET_CHARS = 20_000
+MAX_SNIPPETS = 10
+# Верхняя граница для всего пакета Socket.IO (сниппеты + команда + обвязка);
+# не больше 1 МБ — умолчания engine.io
+MAX_PAYLOAD_BYTES = MAX_SNIPPETS * MAX_SNIPPET_CHARS * 4 + MAX_COMMAND_CHARS * 4 + 1024
+
+Snippet = Annotated[str, StringConstraints(max_length=MAX_SNIPPET_CHARS)]
+
 
 class Message(BaseModel):
     id: str
     role: MessageRole = "bot"
-    content: str
+    content: Annotated[str, StringConstraints(max_length=MAX_COMMAND_CHARS)]
     timestamp: int
 
 
 class MessagePayload(BaseModel):
     message: Message
-    selectedList: list[str]
+    selectedList: list[Snippet] = Field(max_length=MAX_SNIPPETS)  # это и есть snippets
+
+
+class SelectionPayload(BaseModel):
+    """Выделение элементов в редакторе — ещё без команды."""
+    selectedList: list[Snippet] = Field(max_length=MAX_SNIPPETS)
 
 
-def make_bot_reply(text: str) -> Message:
-    """Упаковываем ответ парсера в такую же структуру Message."""
-    return Message(
+def make_bot_reply(text: str) -> dict:
+    """
+    Упаковываем ответ парсера в такую же структуру Message.
+    Собираем без повторной валидации и сразу отдаём dict для отправки.
+    """
+    return Message.model_construct(
         id=str(uuid4()),
         role="bot",
         content=text,
         timestamp=int(time() * 1000),
-    )
\ No newline at end of file
+    ).model_dump()
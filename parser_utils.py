@@ -5,16 +5,28 @@ from bs4 import BeautifulSoup
 from typing import Dict, List
 import sys
 from pathlib import Path
-
-def parse_project_simple(index_html_path: str) -> dict:
+from asset_classifier import classify_asset, split_assets, VENDOR
+
+def parse_project_simple(
+    index_html_path: str,
+    include_vendor: bool = False,
+    vendor_globs: list = None,
+    first_party_globs: list = None
+) -> dict:
     """
     Принимает путь к index.html и извлекает пути к CSS и JS файлам.
+    Сторонние бандлы (jquery, gtm, chunk-vendors и т.п.) по умолчанию
+    отсеиваются через asset_classifier и попадают в vendor_* списки.
+    vendor_globs/first_party_globs по умолчанию берутся из asset_classifier
+    (встроенные глобы + ASSET_VENDOR_GLOBS / ASSET_FIRST_PARTY_GLOBS).
 
     Возвращает:
     {
         "index_html": полный путь,
         "css_files": список css файлов (полные пути),
-        "js_files": список js файлов (полные пути)
+        "js_files": список js файлов (полные пути),
+        "vendor_css_files": отсеянные сторонние css,
+        "vendor_js_files": отсеянные сторонние js
     }
     """
     index_html = Path(index_html_path)
@@ -35,31 +47,47 @@ def parse_project_simple(index_html_path: str) -> dict:
     for link_tag in soup.find_all("link", rel="stylesheet"):
         href = link_tag.get("href")
         if href:
-            css_path = (index_html.parent / href).resolve()
+            css_path = (index_html.parent / href.split("?", 1)[0]).resolve()
             css_files.append(str(css_path))
 
     # Ищем <script src=...>
     for script_tag in soup.find_all("script", src=True):
         src = script_tag.get("src")
         if src:
-            js_path = (index_html.parent / src).resolve()
+            js_path = (index_html.parent / src.split("?", 1)[0]).resolve()
             js_files.append(str(js_path))
 
+    vendor_css_files = []
+    vendor_js_files = []
+    if not include_vendor:
+        css_files, vendor_css_files = split_assets(css_files, vendor_globs, first_party_globs)
+        js_files, vendor_js_files = split_assets(js_files, vendor_globs, first_party_globs)
+
     return {
         "index_html": str(index_html.resolve()),
         "css_files": css_files,
-        "js_files": js_files
+        "js_files": js_files,
+        "vendor_css_files": vendor_css_files,
+        "vendor_js_files": vendor_js_files
     }
 
 
-def load_all_css(css_dir: str) -> str:
+def load_all_css(
+    css_dir: str,
+    include_vendor: bool = False,
+    vendor_globs: list = None,
+    first_party_globs: list = None
+) -> str:
     """
     Считывает все CSS-файлы из указанной директории и объединяет их содержимое в одну строку.
+    Сторонние файлы пропускаются, если include_vendor=False (глобы — как в parse_project_simple).
     """
     contents = []
     for filename in os.listdir(css_dir):
         if filename.lower().endswith(".css"):
             filepath = os.path.join(css_dir, filename)
+            if not include_vendor and classify_asset(filepath, vendor_globs, first_party_globs) == VENDOR:
+                continue
             if os.path.isfile(filepath):
                 with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
                     contents.append(f.read())
@@ -109,7 +137,6 @@ def parse_snippet_for_unique_attrs(snippet: str) -> dict:
 
 
 from bs4 import BeautifulSoup
-import sys
 
 def find_element_in_html(html_content: str, selected_snippet: str):
     """
@@ -119,7 +146,7 @@ def find_element_in_html(html_content: str, selected_snippet: str):
     - Внутренний текст
     
     Если находит совпадение — возвращает этот элемент из html_content.
-    Если нет — выводит ошибку и завершает выполнение.
+    Если нет — выводит ошибку и возвращает None (дальше пробуется fallback_decode_search).
     """
     # Подготовка
     cleaned_snippet = "\n".join([line.strip() for line in selected_snippet.splitlines()])
@@ -127,7 +154,7 @@ def find_element_in_html(html_content: str, selected_snippet: str):
 
     if cleaned_snippet not in cleaned_html:
         print("❌ Не удалось найти сниппет в HTML.")
-        sys.exit(1)
+        return None
 
     # Парсим оба HTML
     soup = BeautifulSoup(html_content, "html.parser")
@@ -149,7 +176,7 @@ def find_element_in_html(html_content: str, selected_snippet: str):
                 return c
 
     print("❌ Сниппет найден как текст, но не удалось найти элемент через BeautifulSoup.")
-    sys.exit(1)
+    return None
 
 
 def fallback_decode_search(html_content: str, snippet: str):
@@ -216,14 +243,15 @@ def collect_related_css(elem, index_html_path: str) -> str:
     return "\n\n".join(relevant_blocks)
 
 
-def collect_related_js(elem, all_js: str) -> str:
+def collect_related_js(elem, all_js) -> str:
     """
     Разбивает all_js на строки и возвращает те, в которых упоминается id или класс элемента.
+    all_js можно передать уже разбитым на строки (список) — например, из индекса сайта.
     Если совпадений нет – возвращает пустую строку.
     """
     elem_id = elem.get("id")
     elem_classes = elem.get("class", [])
-    lines = all_js.split("\n")
+    lines = all_js if isinstance(all_js, list) else all_js.split("\n")
     relevant = []
     found = False
     for line in lines:
@@ -238,7 +266,7 @@ def collect_related_js(elem, all_js: str) -> str:
     return "\n".join(relevant) if found else ""
 
 
-def analyze_dom_and_collect_context(index_html: str, all_css: str, all_js: str, selected_snippet: str) -> dict:
+def analyze_dom_and_collect_context(index_html: str, all_css: str, all_js, selected_snippet: str) -> dict:
     """
     Анализирует DOM из index.html, находит selected_snippet и возвращает:
       - найденный HTML элемент,
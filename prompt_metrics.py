@@ -0,0 +1,54 @@
+# prompt_metrics.py
+
+# Грубая оценка: ~4 символа на токен (для кириллицы и разметки получается с запасом)
+CHARS_PER_TOKEN = 4
+
+_totals = {
+    "requests": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "prefix_versions": {}
+}
+
+
+def estimate_tokens(text_or_chars) -> int:
+    """Оценка числа токенов по тексту или по длине в символах."""
+    chars = text_or_chars if isinstance(text_or_chars, int) else len(text_or_chars)
+    return chars // CHARS_PER_TOKEN
+
+
+def record_prompt_usage(prefix_version: str, prefix_chars: int, usage: dict) -> dict:
+    """
+    Учитывает один запрос к LLM и печатает отчёт по prompt-кэшу:
+      - prefix_tokens: оценка размера статичного префикса;
+      - cache_hit_ratio: доля токенов prompt, взятых провайдером из кэша;
+      - prefix_reused: отправлялся ли этот префикс раньше (кэш у провайдера возможен);
+      - total_cache_hit_ratio: то же по всем запросам с момента запуска.
+    Возвращает отчёт словарём.
+    """
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+
+    seen = _totals["prefix_versions"].get(prefix_version, 0)
+    _totals["prefix_versions"][prefix_version] = seen + 1
+    _totals["requests"] += 1
+    _totals["prompt_tokens"] += prompt_tokens
+    _totals["cached_tokens"] += cached_tokens
+
+    report = {
+        "prefix_version": prefix_version,
+        "prefix_tokens": estimate_tokens(prefix_chars),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_hit_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "prefix_reused": seen > 0,
+        "total_cache_hit_ratio": (
+            _totals["cached_tokens"] / _totals["prompt_tokens"] if _totals["prompt_tokens"] else 0.0
+        )
+    }
+    print(
+        f"[📊] Префикс {prefix_version}: ~{report['prefix_tokens']} ток., "
+        f"из кэша {cached_tokens}/{prompt_tokens} ({report['cache_hit_ratio']:.0%}), "
+        f"всего {report['total_cache_hit_ratio']:.0%}"
+    )
+    return report
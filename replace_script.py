@@ -1,5 +1,6 @@
 from bs4 import BeautifulSoup
-import re
+
+from css_merge import merge_css_into_styles
 
 def apply_html_change(html_path: str, old_html_block: str, new_html_block: str) -> bool:
     """
@@ -45,89 +46,63 @@ def apply_html_change(html_path: str, old_html_block: str, new_html_block: str)
 def apply_css_change_to_html(
     index_html_path: str,
     new_css_rule: str
-):
+) -> bool:
     """
     Обновляет или добавляет CSS-правила в HTML-файле.
     
     Параметры:
       index_html_path: путь к HTML-файлу.
       new_css_rule: строка, содержащая одно или несколько CSS-правил (например, 
-        ".foo { color: red; } .bar { font-size: 14px; }").
-    Логика:
-      1) Разбивает вход new_css_rule на отдельные блоки по '}'.
-      2) Отбрасывает строки, которые целиком — комментарии.
-      3) Для каждого правила:
-         a) Извлекает селектор (то, что до '{').
-         b) Ищет в <style> этот селектор и заменяет весь блок.
-         c) Если не нашёл — добавляет правило в конец последнего <style>,
-            или создаёт новый <style> в <head>.
-      4) Сохраняет HTML, если были изменения.
+        ".foo { color: red; } .bar { font-size: 14px; }"), в том числе внутри @media.
+    Логика (см. css_merge.merge_css_into_styles):
+      1) Тексты всех <style> разбираются один раз в индекс селектор → правило
+         с учётом контекста at-правил.
+      2) Для каждого входящего правила:
+         a) если селектор найден — сливаются декларации: меняются только значения
+            нужных свойств, новые свойства дописываются в тело;
+         b) если не найден — правило добавляется в конец последнего <style>,
+            или создаётся новый <style> в <head>.
+      3) В каждый изменённый <style> текст записывается один раз; HTML
+         сохраняется, если были изменения.
+
+    Возвращает True, если файл был изменён.
     """
-    # 1) Подготовка списка правил
-    rules = []
-    for chunk in new_css_rule.split('}'):
-        if '{' in chunk:
-            rule = chunk.strip() + '}'
-            # 2) пропускаем комментарии вида /* ... */
-            if not re.fullmatch(r"\s*/\*.*?\*/\s*", rule, re.DOTALL):
-                rules.append(rule)
-
-    if not rules:
-        print("[CSS] Пусто или только комментарии — ничего не делаем.")
-        return
-
-    # 3) Загружаем HTML
+    # 1) Загружаем HTML
     with open(index_html_path, "r", encoding="utf-8") as f:
         soup = BeautifulSoup(f, "html.parser")
 
     style_tags = soup.find_all("style")
-    modified = False
-
-    # 3a–c) По каждой чистой паре правило/селектор
-    for rule in rules:
-        selector_match = re.match(r"^(.*?)\s*\{", rule, re.DOTALL)
-        if not selector_match:
-            continue
-        selector = selector_match.group(1).strip()
-        pattern = re.compile(
-            rf"{re.escape(selector)}\s*\{{[^{{}}]*?\}}",
-            re.DOTALL
-        )
-
-        replaced = False
-        for tag in style_tags:
-            css_text = tag.get_text() or ""
-            if pattern.search(css_text):
-                new_css = pattern.sub(rule, css_text)
-                tag.string = new_css
-                print(f"[CSS] Обновлено правило для селектора «{selector}».")
-                replaced = True
-                modified = True
-                break
-
-        if not replaced:
-            # 3c) добавляем новое правило
-            snippet = "\n\n" + rule + "\n"
-            if style_tags:
-                last = style_tags[-1]
-                last.string = (last.get_text() or "") + snippet
-            else:
-                head = soup.head or soup.new_tag("head")
-                new_tag = soup.new_tag("style")
-                new_tag.string = rule
-                head.append(new_tag)
-                if not soup.head:
-                    soup.insert(0, head)
+    style_texts = [tag.get_text() or "" for tag in style_tags]
+
+    # 2) Сливаем все правила за один проход
+    new_texts, changed, added_css, log = merge_css_into_styles(style_texts, new_css_rule)
+
+    if not log:
+        print("[CSS] Пусто или только комментарии — ничего не делаем.")
+        return False
+
+    for action, selector in log:
+        if action == "update":
+            print(f"[CSS] Обновлено правило для селектора «{selector}».")
+        else:
             print(f"[CSS] Добавлено новое правило «{selector}».")
-            modified = True
-
-    # 4) Сохраняем, если были изменения
-    if modified:
-        with open(index_html_path, "w", encoding="utf-8") as f:
-            f.write(str(soup))
-        print(f"✅[CSS] Файл «{index_html_path}» успешно обновлён.")
-    else:
-        print("[CSS] Правил для применения не найдено — файл не изменён.")
+
+    # 3) Записываем только изменённые <style>
+    for idx in changed:
+        style_tags[idx].string = new_texts[idx]
+
+    if added_css:
+        head = soup.head or soup.new_tag("head")
+        new_tag = soup.new_tag("style")
+        new_tag.string = added_css
+        head.append(new_tag)
+        if not soup.head:
+            soup.insert(0, head)
+
+    with open(index_html_path, "w", encoding="utf-8") as f:
+        f.write(str(soup))
+    print(f"✅[CSS] Файл «{index_html_path}» успешно обновлён.")
+    return True
 
 def apply_js_change(js_path, new_js_code):
     if new_js_code.strip().startswith("—") or not new_js_code.strip():
@@ -1,43 +1,155 @@
 # server.py
+import asyncio
 import socketio
-from uuid import uuid4
 from time import time
-from typing import Literal
 
-from pydantic import BaseModel
+import json_codec
+from boot import health_app, warm_up
+from models import MAX_PAYLOAD_BYTES, MessagePayload, SelectionPayload, make_bot_reply
 
-from main import main as run_main  # импорт твоей главной функции
+# ────────── Socket.IO сервер ──────────
 
-# ────────── Pydantic-модели ──────────
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    json=json_codec,
+    max_http_buffer_size=MAX_PAYLOAD_BYTES
+)
+ml_namespace = "/ml"
 
-MessageRole = Literal["user", "bot"]
+_warmup_task = None
+_session_sweep_task = None
 
-class Message(BaseModel):
-    id: str
-    role: MessageRole
-    content: str
-    timestamp: int
 
-class MessagePayload(BaseModel):
-    message: Message
-    selectedList: list[str]  # это и есть snippets
+async def on_startup():
+    # Прогрев идёт в фоне: сервер сразу принимает соединения, а /healthz
+    # отвечает 503, пока индексы и соединение с LLM не готовы
+    global _warmup_task, _session_sweep_task
+    _warmup_task = asyncio.create_task(warm_up())
+    _session_sweep_task = asyncio.create_task(sweep_idle_sessions())
 
-def make_bot_reply(text: str) -> Message:
-    return Message(
-        id=str(uuid4()),
-        role="bot",
-        content=text,
-        timestamp=int(time() * 1000)
-    )
 
-# ────────── Socket.IO сервер ──────────
-
-sio = socketio.AsyncServer(
-    async_mode="asgi",
-    cors_allowed_origins="*"
+app = socketio.ASGIApp(
+    sio,
+    other_asgi_app=health_app,
+    socketio_path="socket.io",
+    on_startup=on_startup
 )
-app = socketio.ASGIApp(sio, socketio_path="socket.io")
-ml_namespace = "/ml"
+
+
+def run_main(**kwargs):
+    # main тянет bs4, openai и весь пайплайн — импортируем при первом использовании
+    from main import main
+    return main(**kwargs)
+
+
+def prepare_context(snippets: list[str]):
+    from main import prepare_context as _prepare_context
+    return _prepare_context(snippets)
+
+
+def is_followup(session: dict, snippets: list[str]) -> bool:
+    # Без результата прошлой правки main ещё мог не импортироваться — не тянем его в event loop
+    if not session.get("element_html"):
+        return False
+    from main import is_followup as _is_followup
+    return _is_followup(session, snippets)
+
+class PartialBatcher:
+    """
+    Копит промежуточные сообщения (partials) по sid и отправляет их пачкой
+    одним событием "partial" — раз в BATCH_INTERVAL секунд или при BATCH_MAX_ITEMS.
+    """
+    BATCH_INTERVAL = 0.1
+    BATCH_MAX_ITEMS = 32
+
+    def __init__(self, event: str = "partial"):
+        self.event = event
+        self._buffers: dict[str, list] = {}
+        self._flush_tasks: dict[str, asyncio.Task] = {}
+
+    async def push(self, sid, item):
+        buffer = self._buffers.setdefault(sid, [])
+        buffer.append(item)
+        if len(buffer) >= self.BATCH_MAX_ITEMS:
+            await self.flush(sid)
+        elif sid not in self._flush_tasks:
+            self._flush_tasks[sid] = asyncio.create_task(self._flush_later(sid))
+
+    async def _flush_later(self, sid):
+        await asyncio.sleep(self.BATCH_INTERVAL)
+        self._flush_tasks.pop(sid, None)
+        await self.flush(sid)
+
+    async def flush(self, sid):
+        task = self._flush_tasks.pop(sid, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        items = self._buffers.pop(sid, None)
+        if items:
+            await sio.emit(self.event, items, namespace=ml_namespace, to=sid)
+
+    def drop(self, sid):
+        task = self._flush_tasks.pop(sid, None)
+        if task is not None:
+            task.cancel()
+        self._buffers.pop(sid, None)
+
+
+partials = PartialBatcher()
+
+# Подготовка контекста по событию select: sid -> asyncio.Task с результатом prepare_context
+prefetched_contexts: dict[str, asyncio.Task] = {}
+
+
+# Состояние диалога по sid: найденный элемент и результат последней правки
+SESSION_TTL_SECONDS = 30 * 60
+SESSION_SWEEP_INTERVAL = 60
+sessions: dict[str, dict] = {}
+
+
+def evict_idle_sessions(now: float = None):
+    """Удаляет сессии, к которым не обращались дольше SESSION_TTL_SECONDS."""
+    now = time() if now is None else now
+    for sid in [sid for sid, s in sessions.items() if now - s["last_seen"] > SESSION_TTL_SECONDS]:
+        del sessions[sid]
+
+
+async def sweep_idle_sessions():
+    """Фоновая задача: раз в SESSION_SWEEP_INTERVAL секунд вычищает простаивающие сессии."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        evict_idle_sessions()
+
+
+def get_session(sid) -> dict:
+    session = sessions.setdefault(sid, {})
+    session["last_seen"] = time()
+    return session
+
+
+async def _prefetch(snippets: list[str]):
+    try:
+        return await asyncio.to_thread(prepare_context, snippets)
+    except Exception as e:
+        # prefetch — только оптимизация, ошибки не должны ронять сервер
+        print(f"⚠️ Prefetch не удался: {e}")
+        return None
+
+
+async def take_prefetched(sid) -> dict:
+    """Забирает подготовленный контекст (дожидаясь prefetch, если он ещё идёт)."""
+    task = prefetched_contexts.pop(sid, None)
+    if task is None:
+        return None
+    return await task
+
+
+def drop_prefetched(sid):
+    """Отменяет prefetch, результат которого не понадобится."""
+    task = prefetched_contexts.pop(sid, None)
+    if task is not None:
+        task.cancel()
 
 @sio.event(namespace=ml_namespace)
 async def connect(sid, environ):
@@ -45,12 +157,32 @@ async def connect(sid, environ):
 
 @sio.event(namespace=ml_namespace)
 async def disconnect(sid):
+    drop_prefetched(sid)
+    sessions.pop(sid, None)
+    partials.drop(sid)
     print(f"❌ Клиент отключился: {sid}")
 
+@sio.event(namespace=ml_namespace)
+async def select(sid, data: dict):
+    """
+    Пользователь выделил элементы, но ещё не ввёл команду.
+    Заранее ищем элемент и собираем контекст, чтобы к приходу
+    команды на критическом пути остался только вызов LLM.
+    """
+    try:
+        payload = SelectionPayload.model_validate(data)
+    except ValueError as e:
+        print(f"⚠️ Некорректное выделение от {sid}: {e}")
+        return
+    drop_prefetched(sid)
+    if payload.selectedList:
+        prefetched_contexts[sid] = asyncio.create_task(_prefetch(payload.selectedList))
+        print(f"[⚡] Готовим контекст заранее для {sid}")
+
 @sio.event(namespace=ml_namespace)
 async def message(sid, data: dict):
     try:
-        # 🔎 Валидация структуры запроса
+        # 🔎 Валидация структуры и размера запроса
         payload = MessagePayload.model_validate(data)
         user_command = payload.message.content
         snippets = payload.selectedList
@@ -61,18 +193,43 @@ async def message(sid, data: dict):
         # 🌀 Отправляем клиенту "loading"
         await sio.emit("loading", namespace=ml_namespace, to=sid)
 
-        # 🚀 Запускаем главный пайплайн
-        explanation = run_main(user_command=user_command, snippets=snippets)
+        # 🚀 Запускаем главный пайплайн в отдельном потоке, статусы этапов уходят пачками
+        loop = asyncio.get_running_loop()
+
+        def on_progress(stage: str):
+            asyncio.run_coroutine_threadsafe(partials.push(sid, {"stage": stage}), loop)
+
+        session = get_session(sid)
+        if is_followup(session, snippets):
+            # Повторная правка идёт по компактному prompt — полный контекст не нужен,
+            # а prefetch мог искать уже изменённый исходный сниппет
+            drop_prefetched(sid)
+            prepared = None
+        else:
+            prepared = await take_prefetched(sid)
+        explanation = await asyncio.to_thread(
+            run_main,
+            user_command=user_command,
+            snippets=snippets,
+            prepared=prepared,
+            session=session,
+            on_progress=on_progress
+        )
 
         # 📤 Отправляем успешный ответ
+        # None — элемент не найден; пустая строка — правка применена, но LLM не дала пояснения
+        if explanation is None:
+            explanation = "❌ Элемент не найден в index.html"
         reply = make_bot_reply(explanation)
-        await sio.emit("message", explanation, namespace=ml_namespace, to=sid)
+        await partials.flush(sid)
+        await sio.emit("message", reply, namespace=ml_namespace, to=sid)
 
 
     except Exception as e:
         print(f"❌ Ошибка при обработке: {e}")
         reply = make_bot_reply(f"⚠️ Ошибка: {str(e)}")
-        await sio.emit("message", explanation, namespace=ml_namespace, to=sid)
+        await partials.flush(sid)
+        await sio.emit("message", reply, namespace=ml_namespace, to=sid)
 
 
 # ────────── Запуск ──────────
@@ -0,0 +1,106 @@
+# site_index.py
+import hashlib
+import os
+import threading
+
+from parser_utils import parse_project_simple
+from indexer_utils import (
+    _map_files,
+    create_js_index,
+    index_css_file,
+    merge_css_records,
+    render_css_summary_for_llm
+)
+
+# Лимит сводки CSS-индекса в prompt (символы; ~4 символа на токен)
+CSS_INDEX_MAX_CHARS = int(os.getenv("CSS_INDEX_MAX_CHARS", "40000"))
+
+# Кэш проиндексированных сайтов: путь к index.html -> индекс сайта
+_site_indexes = {}
+# Блокировки index.html: путь -> threading.Lock (запросы идут в рабочих потоках)
+_site_locks = {}
+_site_locks_guard = threading.Lock()
+
+
+def index_sites(index_html_paths: list, max_workers: int = None) -> dict:
+    """
+    Холодная индексация одного или нескольких сайтов (прогрев, массовая переиндексация).
+
+    CSS всех сайтов раздаётся по одному файлу на воркер общего
+    ProcessPoolExecutor (max_workers по умолчанию = os.cpu_count()),
+    затем результаты собираются обратно по сайтам. id CSS-правил
+    сквозные внутри сайта и идут в порядке файлов, как в create_css_index.
+    JS читается последовательно и хранится уже разбитым на строки (js_lines).
+
+    Возвращает и кэширует словарь:
+    {
+        "<index_html>": {
+            "project": результат parse_project_simple,
+            "css_index": CssIndex с правилами всех CSS-файлов сайта,
+            "js_lines": строки всех JS-файлов сайта для collect_related_js
+        }
+    }
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    projects = [parse_project_simple(path) for path in index_html_paths]
+
+    all_css = [css for proj in projects for css in proj["css_files"]]
+    css_results = _map_files(index_css_file, all_css, max_workers)
+
+    result = {}
+    css_pos = 0
+    for path, proj in zip(index_html_paths, projects):
+        n_css = len(proj["css_files"])
+        site = {
+            "project": proj,
+            "css_index": merge_css_records(css_results[css_pos:css_pos + n_css]),
+            "js_lines": [line for rec in create_js_index(proj["js_files"]) for line in rec["lines"]]
+        }
+        css_pos += n_css
+        result[path] = site
+        _site_indexes[path] = site
+        print(f"✅ Проиндексирован сайт: {path} ({len(site['css_index'])} CSS-правил)")
+
+    return result
+
+
+def get_site_index(index_html_path: str, max_workers: int = 1) -> dict:
+    """
+    Возвращает индекс сайта из кэша, при промахе — индексирует его.
+    На пути запроса индексация последовательная; пул — только через явный index_sites.
+
+    Кэш живёт всё время работы процесса: изменения внешних CSS/JS на диске сами
+    не подхватываются. Чтобы переиндексировать сайт, нужно снова вызвать
+    index_sites — он перезапишет запись в кэше, а вместе с ней сменится и
+    версия CSS-индекса (get_css_index_text). Правки из пайплайна этого не
+    требуют: они меняют только index.html, а DOM читается заново на каждый запрос.
+    """
+    if index_html_path not in _site_indexes:
+        index_sites([index_html_path], max_workers=max_workers)
+    return _site_indexes[index_html_path]
+
+
+def get_css_index_text(site: dict) -> tuple[str, str]:
+    """
+    Текст CSS-индекса для LLM и его версия (sha1 от текста).
+    Это сводка селекторов по файлам, ограниченная CSS_INDEX_MAX_CHARS
+    (см. render_css_summary_for_llm): полный индекс с телами правил слишком велик.
+    Считаются один раз на индекс сайта; версия меняется только при переиндексации,
+    поэтому префикс prompt с этим индексом остаётся побайтово стабильным.
+    """
+    if "css_index_str" not in site:
+        site["css_index_str"] = render_css_summary_for_llm(site["css_index"], CSS_INDEX_MAX_CHARS)
+        site["css_index_version"] = hashlib.sha1(site["css_index_str"].encode("utf-8")).hexdigest()[:12]
+    return site["css_index_str"], site["css_index_version"]
+
+
+def site_lock(index_html_path: str) -> threading.Lock:
+    """
+    Блокировка файла index.html сайта. Под ней читается DOM при сборке контекста
+    и применяются правки HTML/CSS, чтобы параллельные запросы не затирали
+    изменения друг друга и не читали файл посреди записи.
+    """
+    with _site_locks_guard:
+        return _site_locks.setdefault(index_html_path, threading.Lock())
@@ -0,0 +1,75 @@
+# test_llm_client.py
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import llm_client
+
+
+class FakeBackend:
+    """Бэкенд-заглушка: i-й вызов отвечает по i-му сценарию (задержка, ответ или исключение)."""
+
+    def __init__(self, *scenarios):
+        self.scenarios = list(scenarios)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model, timeout):
+        with self._lock:
+            delay, answer = self.scenarios[min(self.calls, len(self.scenarios) - 1)]
+            self.calls += 1
+        time.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, {"prompt_tokens": 1, "completion_tokens": 1, "cached_tokens": 0}
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(llm_client, "DEFAULT_HEDGE_DELAY", 0.05)
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT", 2.0)
+
+    def install(*scenarios):
+        fake = FakeBackend(*scenarios)
+        llm_client.set_backend(fake)
+        return fake
+
+    yield install
+    llm_client.set_backend(llm_client.openrouter_backend)
+
+
+def test_slow_primary_is_hedged(backend):
+    fake = backend((1.0, "медленно"), (0, "быстро"))
+    started = time.monotonic()
+    assert llm_client.call_llm("p", model="test-slow") == "быстро"
+    assert fake.calls == 2
+    assert time.monotonic() - started < 0.5
+
+
+def test_fast_failure_sends_hedge_at_once(backend):
+    fake = backend((0, RuntimeError("502")), (0, "ок"))
+    assert llm_client.call_llm("p", model="test-fail") == "ок"
+    assert fake.calls == 2
+
+
+def test_empty_answer_is_not_accepted(backend):
+    backend((0, "  "), (0, "ок"))
+    assert llm_client.call_llm("p", model="test-empty") == "ок"
+
+
+def test_deadline(backend, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT", 0.2)
+    backend((1.0, "поздно"))
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        llm_client.call_llm("p", model="test-deadline")
+    assert time.monotonic() - started < 0.5
+
+
+def test_style_commands_match_word_starts():
+    assert llm_client.is_small_edit("сделай фон синим")
+    assert not llm_client.is_small_edit("добавь телефон в шапку")
+    assert not llm_client.is_small_edit("добавь больше пунктов")